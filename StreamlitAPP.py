@@ -36,11 +36,22 @@ with st.sidebar:
 	num_questions = st.number_input("Number of MCQs", value=3, min_value=1, max_value=20)
 	subject = st.text_input("Subject", value="general knowledge")
 	tone = st.selectbox("Tone", options=["simple", "normal", "academic", "funny"], index=1)
-	model_choice = st.selectbox("Model", options=["gpt-3.5-turbo", "gpt-3.5-turbo-0613", "gpt-4"], index=0, help="Choose the model to use for generation (gpt-3.5-turbo is cheaper).")
+	model_choice = st.selectbox("Model", options=["auto (routed)", "gpt-3.5-turbo", "gpt-3.5-turbo-0613", "gpt-4"], index=1, help="Choose the model to use for generation (gpt-3.5-turbo is cheaper). 'auto' picks a model per request from input size, question count and subject (rules in MCQ_ROUTING_RULES).")
+	hedge = st.checkbox("Hedge slow requests", value=False, help="If the model has not answered within the threshold, race a second model and keep the first valid quiz.")
+	hedge_after = st.number_input("Hedge after (seconds)", value=8.0, min_value=0.5, max_value=120.0, step=0.5, disabled=not hedge)
 	temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.7, step=0.05)
 	use_api = st.checkbox("Use OpenAI (requires API key)", value=bool(OPENAI_KEY))
 	estimate_cost = st.checkbox("Show cost estimate (approx)", value=False)
 
+# one router per run, shared by the cost estimate and generation
+router = None
+if model_choice.startswith("auto") or hedge:
+	from src.mcqgenerator.router import ModelRouter
+
+	# a fixed model choice is kept as the primary by routing everything to it
+	rules = None if model_choice.startswith("auto") else [{"model": model_choice}]
+	router = ModelRouter(rules=rules, hedge_after=hedge_after if hedge else None, temperature=temperature)
+
 uploaded = st.file_uploader("Upload a .txt or .pdf file (optional)", type=["txt", "pdf"], help="PDF and TXT supported. Scanned PDFs may not extract text well.")
 text_area = st.text_area("Or paste text here (used if no file is uploaded)", height=250)
 
@@ -80,12 +91,19 @@ with col2:
 	st.write("\n")
 	if estimate_cost and TEXT:
 		# very rough example rates - we provide only an approximate token count (do not charge user)
-		if model_choice and "3.5" in model_choice:
-			per_k = 0.002
-		else:
-			per_k = 0.03
-		est_cost = (est_tokens / 1000.0) * per_k
-		st.caption(f"Est. cost for input: ${est_cost:.5f} (approx)")
+		def per_k_rate(name):
+			return 0.002 if name and "3.5" in name else 0.03
+
+		cost_model = model_choice
+		if router is not None:
+			cost_model = router.choose_model({"text": TEXT, "number": int(num_questions), "subject": subject})
+		est_cost = (est_tokens / 1000.0) * per_k_rate(cost_model)
+		st.caption(f"Est. cost for input ({cost_model}): ${est_cost:.5f} (approx)")
+		if hedge:
+			# a hedged request may also pay for (part of) a second call
+			hedge_model = router.choose_hedge_model(cost_model)
+			hedge_cost = (est_tokens / 1000.0) * per_k_rate(hedge_model)
+			st.caption(f"Up to ${est_cost + hedge_cost:.5f} if the request is hedged (second call to {hedge_model})")
 
 if run:
 	if not TEXT or len(TEXT.strip()) < 10:
@@ -97,12 +115,11 @@ if run:
 			st.spinner("Generating...")
 			try:
 				# set chosen model and temp so MCQGenerator picks it up on import
-				os.environ["OPENAI_MODEL"] = model_choice
+				if not model_choice.startswith("auto"):
+					os.environ["OPENAI_MODEL"] = model_choice
 				os.environ["OPENAI_TEMP"] = str(temperature)
 				# Use the chain only if requested; handle missing API and fallback to sample
 				if use_api:
-					from src.mcqgenerator.MCQGenerator import generate_evaluate_chain
-
 					inputs = {
 						"text": TEXT,
 						"number": int(num_questions),
@@ -111,7 +128,16 @@ if run:
 						"response_json": json.dumps(sample_response),
 					}
 					try:
-						result = generate_evaluate_chain(inputs)
+						if router is not None:
+							result = router.generate(inputs, hedge=hedge)
+							st.caption(f"Answered by {result['model']}" + (" (hedged)" if result.get("hedged") else ""))
+							# remember the routed model so per-question regeneration uses it too
+							st.session_state.routed_model = result["model"]
+						else:
+							from src.mcqgenerator.MCQGenerator import generate_evaluate_chain
+
+							result = generate_evaluate_chain(inputs)
+							st.session_state.routed_model = model_choice
 					except ImportError as ie:
 						# specific guidance for missing langchain_community
 						msg = str(ie)
@@ -135,11 +161,15 @@ if run:
 							raise
 
 					quiz = result.get("quiz")
-					# sometimes quiz may be a JSON string
-					try:
-						parsed_quiz = json.loads(quiz) if isinstance(quiz, str) else quiz
-					except Exception:
-						parsed_quiz = quiz
+					if result.get("parsed_quiz") is not None:
+						# already parsed and validated by the router
+						parsed_quiz = result["parsed_quiz"]
+					else:
+						# sometimes quiz may be a JSON string
+						try:
+							parsed_quiz = json.loads(quiz) if isinstance(quiz, str) else quiz
+						except Exception:
+							parsed_quiz = quiz
 					st.success("Generated quiz (see table below)")
 				else:
 					parsed_quiz = sample_response
@@ -193,7 +223,7 @@ if run:
 					def regenerate_question(qid):
 						# regenerate only this question using quiz_chain with number=1
 						try:
-							from src.mcqgenerator.MCQGenerator import generate_evaluate_chain
+							from src.mcqgenerator.MCQGenerator import build_generate_evaluate_chain
 							sample = {"1": {"mcq": "updated mcq", "options": {"a": "choice", "b": "choice", "c": "choice", "d": "choice"}, "correct": "a"}}
 
 							inputs_single = {
@@ -205,7 +235,9 @@ if run:
 							}
 
 							with st.spinner(f"Regenerating question {qid}..."):
-								single_out = generate_evaluate_chain(inputs_single)
+								# use the model that answered the original request (routed or selected)
+								single_chain = build_generate_evaluate_chain(st.session_state.get("routed_model"), temperature)
+								single_out = single_chain(inputs_single)
 
 							# quiz_chain returns a dictionary-like output where quiz is present as string
 							if isinstance(single_out, dict):
@@ -24,9 +24,6 @@ try:
 except Exception:
     model_temp = 0.7
 
-# create the LLM using the selected model and temperature
-llm = ChatOpenAI(openai_api_key=key, model_name=model_name, temperature=model_temp)
-
 template="""
 Text:{text}
 You are an expert MCQ maker. Given the above text, it is your job to \
@@ -44,9 +41,6 @@ quiz_generation_prompt = PromptTemplate(
     template=template)
 
 
-quiz_chain=LLMChain(llm=llm,prompt=quiz_generation_prompt,output_key="quiz",verbose=True)
-
-
 template2="""
 You are an expert english grammarian and writer. Given a Multiple Choice Quiz for {subject} students.\
 You need to evaluate the complexity of the question and give a complete analysis of the quiz. Only use at max 50 words for complexity analysis. 
@@ -61,9 +55,24 @@ Check from an expert English Writer of the above quiz:
 
 quiz_evaluation_prompt=PromptTemplate(input_variables=["subject", "quiz"], template=template2)
 
-review_chain=LLMChain(llm=llm, prompt=quiz_evaluation_prompt, output_key="review", verbose=True)
+
+def build_generate_evaluate_chain(model=None, temperature=None):
+    """Build the generate -> review SequentialChain for a given model.
+
+    Falls back to OPENAI_MODEL / OPENAI_TEMP when model or temperature are not
+    given. Used by the router to create one chain per routed model.
+    """
+    llm = ChatOpenAI(openai_api_key=key,
+                     model_name=model or model_name,
+                     temperature=model_temp if temperature is None else temperature)
+
+    quiz_chain=LLMChain(llm=llm,prompt=quiz_generation_prompt,output_key="quiz",verbose=True)
+    review_chain=LLMChain(llm=llm, prompt=quiz_evaluation_prompt, output_key="review", verbose=True)
+
+    # This is an Overall Chain where we run the two chains in Sequence
+    return SequentialChain(chains=[quiz_chain, review_chain], input_variables=["text", "number", "subject", "tone", "response_json"],
+                           output_variables=["quiz", "review"], verbose=True,)
 
 
-# This is an Overall Chain where we run the two chains in Sequence
-generate_evaluate_chain=SequentialChain(chains=[quiz_chain, review_chain], input_variables=["text", "number", "subject", "tone", "response_json"],
-                                        output_variables=["quiz", "review"], verbose=True,)
+# default chain using the model and temperature selected through the environment
+generate_evaluate_chain=build_generate_evaluate_chain()
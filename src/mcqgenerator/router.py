@@ -0,0 +1,310 @@
+"""Cost-aware model routing and hedged generation.
+
+A router picks the model for each request from the input size, the number of
+questions and the subject, using an ordered list of rules (first match wins).
+It can optionally hedge: if the primary backend has not returned a valid quiz
+within ``hedge_after`` seconds, a second call is raced against it and the first
+valid parsed quiz wins. The second call goes to the same model unless a
+``hedge_model`` (or MCQ_HEDGE_MODEL) is configured. The race runs as asyncio
+tasks: the losing call is cancelled, which aborts its request for async
+backends (such as the LangChain chain); plain sync callables run in a thread and
+are left to finish in the background.
+
+A backend is any callable (or ``async def``) taking the chain inputs dict and
+returning a dict with at least a ``quiz`` key (the same shape
+``generate_evaluate_chain`` returns), so the router can be exercised with local
+stub functions instead of OpenAI.
+"""
+import os
+import json
+import asyncio
+import inspect
+import concurrent.futures as cf
+
+from src.mcqgenerator.utils import extract_json_from_text
+from src.mcqgenerator.logger import logging
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_HEDGE_AFTER = 8.0
+
+# openai exception names that hedging cannot fix; checked by name so the router
+# does not depend on a particular openai version
+FATAL_ERROR_NAMES = {"AuthenticationError", "PermissionDeniedError", "NotFoundError"}
+
+# cheap model for everyday quizzes, gpt-4 only for long inputs / big quizzes
+DEFAULT_RULES = [
+    {"model": "gpt-4", "min_chars": 12000},
+    {"model": "gpt-4", "min_questions": 11},
+    {"model": "gpt-3.5-turbo"},
+]
+
+
+def _as_bound(name, value):
+    """Coerce a numeric rule bound (possibly a string from JSON/env) to int."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"routing rule '{name}' must be an integer, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"routing rule '{name}' must be an integer, got {value!r}")
+
+
+class RouteRule:
+    """A single routing rule; every condition that is set must match."""
+
+    def __init__(self, model, min_chars=None, max_chars=None,
+                 min_questions=None, max_questions=None, subjects=None):
+        self.model = model
+        self.min_chars = _as_bound("min_chars", min_chars)
+        self.max_chars = _as_bound("max_chars", max_chars)
+        self.min_questions = _as_bound("min_questions", min_questions)
+        self.max_questions = _as_bound("max_questions", max_questions)
+        # a single subject may be given as a plain string
+        if isinstance(subjects, str):
+            subjects = [subjects]
+        if subjects is not None and (not isinstance(subjects, (list, tuple)) or not subjects
+                                     or not all(isinstance(s, str) and s.strip() for s in subjects)):
+            # an empty list would otherwise match every subject
+            raise ValueError(f"routing rule 'subjects' must be a subject or a non-empty list of subjects: {subjects}")
+        # subjects are compared case-insensitively
+        self.subjects = [s.strip().lower() for s in subjects] if subjects is not None else None
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError(f"routing rule must be an object: {data}")
+        if not data.get("model"):
+            raise ValueError(f"routing rule is missing 'model': {data}")
+        return cls(
+            model=data["model"],
+            min_chars=data.get("min_chars"),
+            max_chars=data.get("max_chars"),
+            min_questions=data.get("min_questions"),
+            max_questions=data.get("max_questions"),
+            subjects=data.get("subjects"),
+        )
+
+    def matches(self, n_chars, n_questions, subject):
+        if self.min_chars is not None and n_chars < self.min_chars:
+            return False
+        if self.max_chars is not None and n_chars > self.max_chars:
+            return False
+        if self.min_questions is not None and n_questions < self.min_questions:
+            return False
+        if self.max_questions is not None and n_questions > self.max_questions:
+            return False
+        if self.subjects is not None and (subject or "").strip().lower() not in self.subjects:
+            return False
+        return True
+
+    def __repr__(self):
+        return f"RouteRule(model={self.model!r})"
+
+
+def load_rules(rules=None):
+    """Build RouteRule objects from a list of dicts, a JSON string or MCQ_ROUTING_RULES."""
+    if rules is None:
+        rules = os.getenv("MCQ_ROUTING_RULES") or DEFAULT_RULES
+    if isinstance(rules, str):
+        rules = json.loads(rules)
+    return [r if isinstance(r, RouteRule) else RouteRule.from_dict(r) for r in rules]
+
+
+def parse_quiz(quiz):
+    """Parse raw model output into a quiz dict, raising ValueError if it is not a usable quiz."""
+    if isinstance(quiz, str):
+        try:
+            quiz = json.loads(quiz)
+        except Exception:
+            quiz = extract_json_from_text(quiz)
+
+    if not isinstance(quiz, dict) or not quiz:
+        raise ValueError("quiz is not a non-empty JSON object")
+    for qid, value in quiz.items():
+        if not isinstance(value, dict) or not all(k in value for k in ("mcq", "options", "correct")):
+            raise ValueError(f"question {qid} is missing mcq/options/correct")
+    return quiz
+
+
+def chain_backend(model, temperature=None):
+    """Return an async backend calling the LangChain generate/review chain for `model`.
+
+    The chain is built here, on the caller's thread, so a hedged race to the
+    same model shares one chain; `acall` lets a losing call be cancelled
+    mid-request.
+    """
+    # imported lazily so stub backends work without langchain / an API key
+    from src.mcqgenerator.MCQGenerator import build_generate_evaluate_chain
+
+    chain = build_generate_evaluate_chain(model, temperature)
+
+    async def backend(inputs):
+        return await chain.acall(inputs)
+
+    backend.model = model
+    return backend
+
+
+def is_fatal_error(exc):
+    """True for errors a second call cannot fix (missing packages, bad key/config)."""
+    if isinstance(exc, ImportError):
+        return True
+    if type(exc).__name__ in FATAL_ERROR_NAMES:
+        return True
+    msg = str(exc).lower()
+    return "invalid_api_key" in msg or "incorrect api key" in msg
+
+
+async def _call_backend(backend, inputs, executor):
+    # async backends run as tasks and can be cancelled; plain callables run on
+    # the executor and cannot be interrupted once started
+    if inspect.iscoroutinefunction(backend):
+        return await backend(inputs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, backend, inputs)
+
+
+class ModelRouter:
+    """Pick a model per request and optionally hedge slow calls with a second backend.
+
+    `backends` maps model names to backend callables (sync or `async def`);
+    models without an entry get a `chain_backend` on first use. `hedge_model`
+    is the backend raced against the primary one when hedging (MCQ_HEDGE_MODEL,
+    else a second call to the primary model so a slow cheap request never pays
+    for a pricier one).
+    """
+
+    def __init__(self, rules=None, backends=None, default_model=DEFAULT_MODEL,
+                 hedge_after=None, hedge_model=None, temperature=None):
+        self.rules = load_rules(rules)
+        self.backends = dict(backends or {})
+        self.default_model = default_model
+        if hedge_after is None:
+            hedge_after = os.getenv("MCQ_HEDGE_AFTER")
+        self.hedge_after = float(hedge_after) if hedge_after not in (None, "") else None
+        self.hedge_model = hedge_model or os.getenv("MCQ_HEDGE_MODEL") or None
+        self.temperature = temperature
+
+    def choose_model(self, inputs):
+        n_chars = len(inputs.get("text") or "")
+        try:
+            n_questions = int(inputs.get("number") or 0)
+        except (TypeError, ValueError):
+            n_questions = 0
+        subject = inputs.get("subject")
+
+        for rule in self.rules:
+            if rule.matches(n_chars, n_questions, subject):
+                return rule.model
+        return self.default_model
+
+    def choose_hedge_model(self, primary):
+        return self.hedge_model or primary
+
+    def get_backend(self, model):
+        if model not in self.backends:
+            self.backends[model] = chain_backend(model, self.temperature)
+        return self.backends[model]
+
+    def generate(self, inputs, hedge=None):
+        """Run the routed request and return the backend output plus `model` and `parsed_quiz`.
+
+        Hedging is used when `hedge` is true, or when it is None and a
+        `hedge_after` threshold is configured. A valid quiz always wins; if no
+        call produced one, the last raw output is returned with `parsed_quiz`
+        set to None so callers can still show it. Use `agenerate` from code
+        that already runs an event loop (e.g. a notebook).
+        """
+        return asyncio.run(self.agenerate(inputs, hedge=hedge))
+
+    async def agenerate(self, inputs, hedge=None):
+        primary = self.choose_model(inputs)
+        if hedge is None:
+            hedge = self.hedge_after is not None
+        logging.info(f"routing request to {primary} (hedge={bool(hedge)})")
+
+        # resolve backends up front so chain build / import errors surface here
+        calls = [(primary, self.get_backend(primary))]
+        if hedge:
+            secondary = self.choose_hedge_model(primary)
+            calls.append((secondary, self.get_backend(secondary)))
+        hedge_after = self.hedge_after if self.hedge_after is not None else DEFAULT_HEDGE_AFTER
+
+        executor = cf.ThreadPoolExecutor(max_workers=len(calls))
+        try:
+            return await self._race(inputs, calls, hedge_after, executor)
+        finally:
+            # don't block on a sync loser that is still running
+            executor.shutdown(wait=False)
+
+    def _finish(self, model, result):
+        out = dict(result) if isinstance(result, dict) else {"quiz": result}
+        try:
+            out["parsed_quiz"] = parse_quiz(out.get("quiz"))
+        except ValueError:
+            out["parsed_quiz"] = None
+        out["model"] = model
+        return out
+
+    async def _race(self, inputs, calls, hedge_after, executor):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = {}
+        errors = []
+        fallback = None
+        primary = calls[0][0]
+        calls = list(calls)
+
+        def launch():
+            model, backend = calls.pop(0)
+            task = asyncio.ensure_future(_call_backend(backend, inputs, executor))
+            tasks[task] = model
+            return task
+
+        pending = {launch()}
+        try:
+            while pending:
+                timeout = max(0.0, hedge_after - (loop.time() - start)) if calls else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    model = tasks[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        if is_fatal_error(e):
+                            raise
+                        logging.info(f"{model} call failed: {e}")
+                        errors.append(e)
+                        continue
+
+                    out = self._finish(model, result)
+                    out["hedged"] = len(tasks) > 1
+                    if out["parsed_quiz"] is None:
+                        logging.info(f"{model} returned no valid quiz")
+                        fallback = out
+                        continue
+                    logging.info(f"{model} won after {loop.time() - start:.2f}s")
+                    return out
+
+                # primary too slow or failed: race (or fall back to) the second backend
+                if calls:
+                    logging.info(f"hedging {primary} with {calls[0][0]}")
+                    pending.add(launch())
+
+            if fallback is not None:
+                fallback["hedged"] = len(tasks) > 1
+                return fallback
+            if len(errors) == 1:
+                raise errors[0]
+            raise RuntimeError("all backends failed: " + "; ".join(
+                f"{model}: {e}" for model, e in zip(tasks.values(), errors))) from errors[-1]
+        finally:
+            # cancel the loser; async backends are aborted mid-request
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from src.mcqgenerator.router import ModelRouter, RouteRule, load_rules, parse_quiz
+
+
+QUIZ = json.dumps({"1": {"mcq": "What is 2 + 2?", "options": {"a": "3", "b": "4"}, "correct": "b"}})
+
+
+def ok(delay=0.0, review="ok"):
+    def backend(inputs):
+        time.sleep(delay)
+        return {"quiz": QUIZ, "review": review}
+    return backend
+
+
+def invalid(delay=0.0):
+    def backend(inputs):
+        time.sleep(delay)
+        return {"quiz": "sorry, I cannot do that"}
+    return backend
+
+
+def failing(delay=0.0):
+    def backend(inputs):
+        time.sleep(delay)
+        raise RuntimeError("429 insufficient_quota")
+    return backend
+
+
+def test_choose_model_first_matching_rule_wins():
+    router = ModelRouter(rules=[
+        {"model": "subject-model", "subjects": ["Physics"]},
+        {"model": "long-model", "min_chars": 100},
+        {"model": "big-model", "min_questions": 10},
+        {"model": "cheap"},
+    ])
+
+    assert router.choose_model({"text": "x" * 500, "number": 20, "subject": " physics "}) == "subject-model"
+    assert router.choose_model({"text": "x" * 500, "number": 20, "subject": "bio"}) == "long-model"
+    assert router.choose_model({"text": "x", "number": "12", "subject": "bio"}) == "big-model"
+    assert router.choose_model({"text": "x", "number": 3, "subject": "bio"}) == "cheap"
+
+
+def test_choose_model_falls_back_to_default():
+    router = ModelRouter(rules=[{"model": "gpt-4", "max_questions": 2}], default_model="cheap")
+    assert router.choose_model({"text": "x", "number": 5}) == "cheap"
+
+
+def test_default_rules_route_small_quiz_to_cheap_model():
+    router = ModelRouter(rules=None)
+    assert router.choose_model({"text": "short text", "number": 3, "subject": "bio"}) == "gpt-3.5-turbo"
+    assert router.choose_model({"text": "x" * 20000, "number": 3}) == "gpt-4"
+
+
+def test_hedge_defaults_to_same_model(monkeypatch):
+    monkeypatch.delenv("MCQ_HEDGE_MODEL", raising=False)
+    router = ModelRouter()
+    assert router.choose_hedge_model("gpt-3.5-turbo") == "gpt-3.5-turbo"
+
+
+def test_hedge_model_from_setting(monkeypatch):
+    monkeypatch.setenv("MCQ_HEDGE_MODEL", "gpt-4")
+    assert ModelRouter().choose_hedge_model("gpt-3.5-turbo") == "gpt-4"
+    assert ModelRouter(hedge_model="other").choose_hedge_model("gpt-3.5-turbo") == "other"
+
+
+def test_rule_accepts_single_subject_string():
+    rule = RouteRule.from_dict({"model": "gpt-4", "subjects": "Physics"})
+    assert rule.subjects == ["physics"]
+    assert rule.matches(10, 1, "physics")
+
+
+def test_rule_coerces_numeric_strings():
+    rule = RouteRule.from_dict({"model": "gpt-4", "min_chars": "100", "min_questions": "5"})
+    assert rule.min_chars == 100
+    assert rule.matches(100, 5, None)
+    assert not rule.matches(99, 5, None)
+
+
+@pytest.mark.parametrize("data", [
+    {"min_chars": 10},
+    {"model": "gpt-4", "min_chars": "many"},
+    {"model": "gpt-4", "max_questions": [1]},
+    {"model": "gpt-4", "subjects": [1, 2]},
+    {"model": "gpt-4", "subjects": []},
+    {"model": "gpt-4", "min_chars": True},
+    {"model": "gpt-4", "max_chars": 1.5},
+    "gpt-4",
+])
+def test_invalid_rules_raise_at_load_time(data):
+    with pytest.raises(ValueError):
+        load_rules([data])
+
+
+def test_load_rules_from_env(monkeypatch):
+    monkeypatch.setenv("MCQ_ROUTING_RULES", '[{"model": "env-model"}]')
+    assert [r.model for r in load_rules()] == ["env-model"]
+
+
+def test_parse_quiz_extracts_json_from_text():
+    assert parse_quiz("Here you go:\n" + QUIZ + "\nEnjoy!")["1"]["correct"] == "b"
+    with pytest.raises(ValueError):
+        parse_quiz('{"1": {"mcq": "no options"}}')
+
+
+def test_unhedged_keeps_raw_output_when_quiz_is_invalid():
+    router = ModelRouter(rules=[{"model": "cheap"}], backends={"cheap": invalid()})
+    out = router.generate({"text": "x"}, hedge=False)
+    assert out["model"] == "cheap"
+    assert out["hedged"] is False
+    assert out["parsed_quiz"] is None
+    assert out["quiz"] == "sorry, I cannot do that"
+
+
+def test_fast_primary_is_not_hedged():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": ok(), "backup": failing()}, hedge_after=0.5)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "cheap"
+    assert out["hedged"] is False
+    assert out["parsed_quiz"]["1"]["mcq"] == "What is 2 + 2?"
+
+
+def test_secondary_wins_after_hedge_threshold():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": ok(delay=1.0), "backup": ok(review="backup")}, hedge_after=0.05)
+    start = time.monotonic()
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    assert out["hedged"] is True
+    assert out["review"] == "backup"
+    assert time.monotonic() - start < 0.8
+
+
+def test_hedges_early_when_primary_fails():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": failing(), "backup": ok()}, hedge_after=5.0)
+    start = time.monotonic()
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    assert out["hedged"] is True
+    assert time.monotonic() - start < 1.0
+
+
+def test_late_invalid_primary_does_not_win():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": invalid(delay=0.1), "backup": ok(delay=0.3)}, hedge_after=0.05)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    assert out["hedged"] is True
+
+
+def test_slow_primary_still_wins_when_secondary_is_invalid():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": ok(delay=0.2), "backup": invalid()}, hedge_after=0.05)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "cheap"
+    assert out["hedged"] is True
+
+
+def test_hedge_to_same_model_by_default(monkeypatch):
+    monkeypatch.delenv("MCQ_HEDGE_MODEL", raising=False)
+    calls = []
+
+    def flaky(inputs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return {"quiz": QUIZ}
+
+    router = ModelRouter(rules=[{"model": "cheap"}], backends={"cheap": flaky}, hedge_after=0.05)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "cheap"
+    assert out["hedged"] is True
+    assert len(calls) == 2
+
+
+def test_all_backends_failing_raises():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": failing(), "backup": failing()}, hedge_after=0.05)
+    with pytest.raises(RuntimeError) as exc:
+        router.generate({"text": "x"})
+    assert "cheap" in str(exc.value)
+    assert "backup" in str(exc.value)
+
+
+def test_unhedged_failure_raises_original_error():
+    router = ModelRouter(rules=[{"model": "cheap"}], backends={"cheap": failing()})
+    with pytest.raises(RuntimeError, match="^429 insufficient_quota$"):
+        router.generate({"text": "x"}, hedge=False)
+
+
+def test_hedged_returns_raw_output_when_no_valid_quiz():
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": failing(), "backup": invalid()}, hedge_after=0.05)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    assert out["hedged"] is True
+    assert out["parsed_quiz"] is None
+    assert out["quiz"] == "sorry, I cannot do that"
+
+
+@pytest.mark.parametrize("error", [
+    ImportError("No module named 'langchain_community'"),
+    type("AuthenticationError", (Exception,), {})("bad key"),
+])
+def test_fatal_errors_are_not_hedged(error):
+    calls = []
+
+    def broken(inputs):
+        raise error
+
+    def backup(inputs):
+        calls.append(inputs)
+        return {"quiz": QUIZ}
+
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": broken, "backup": backup}, hedge_after=5.0)
+    with pytest.raises(type(error)):
+        router.generate({"text": "x"})
+    assert calls == []
+
+
+def test_async_loser_is_cancelled():
+    state = {}
+
+    async def slow(inputs):
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return {"quiz": QUIZ}
+
+    async def fast(inputs):
+        return {"quiz": QUIZ}
+
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": slow, "backup": fast}, hedge_after=0.05)
+    start = time.monotonic()
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    assert state.get("cancelled") is True
+    assert time.monotonic() - start < 0.8
+
+
+def test_sync_loser_is_not_interrupted():
+    finished = threading.Event()
+
+    def slow(inputs):
+        time.sleep(0.3)
+        finished.set()
+        return {"quiz": QUIZ}
+
+    router = ModelRouter(rules=[{"model": "cheap"}], hedge_model="backup",
+                         backends={"cheap": slow, "backup": ok()}, hedge_after=0.05)
+    out = router.generate({"text": "x"})
+    assert out["model"] == "backup"
+    # generate() returns without waiting, but the thread runs to completion
+    assert not finished.is_set()
+    assert finished.wait(2.0)
+
+
+def test_agenerate_with_async_backend():
+    async def backend(inputs):
+        return {"quiz": QUIZ}
+
+    router = ModelRouter(rules=[{"model": "cheap"}], backends={"cheap": backend})
+    out = asyncio.run(router.agenerate({"text": "x"}, hedge=False))
+    assert out["model"] == "cheap"
+    assert out["parsed_quiz"]["1"]["correct"] == "b"